@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Compares how much memory exporting a single large page takes with the string
+based text path (decode, pass through LXML, re-encode) and with the bytes based
+one used by the export. Each path runs in a fresh process, and the increase of
+its peak resident memory is reported as multiples of the page size, which
+approximates the number of full copies of the text that were made.
+
+Usage: python benchmarks/text_pipeline.py [page size in MiB]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml import etree  # noqa: E402
+import phpserialize  # noqa: E402
+
+from dokuwiki2findologic.doku import Page  # noqa: E402
+from dokuwiki2findologic.xml import create_item_for_page, iter_chunk  # noqa
+
+LINE = 'Installation & setup of <component> für Übersicht: see docs.\n'
+
+
+def create_page(base_dir, size):
+    os.makedirs(base_dir + '/data/meta')
+    os.makedirs(base_dir + '/data/pages')
+    metadata = {b'current': {b'title': b'Benchmark'}, b'persistent': {}}
+    with open(base_dir + '/data/meta/bench.meta', 'wb') as metadata_file:
+        metadata_file.write(phpserialize.dumps(metadata))
+    # Written in blocks, since Linux passes the peak memory usage of this
+    # process on to the ones it starts.
+    block = LINE.encode('utf-8') * 1024
+    with open(base_dir + '/data/pages/bench.txt', 'wb') as text_file:
+        for _ in range(size // len(block)):
+            text_file.write(block)
+
+
+def peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def export_page(base_dir, mode):
+    before = peak_rss()
+    page = Page(base_dir, 'bench')
+    with open(os.devnull, 'wb') as outfile:
+        if mode == 'str':
+            items = etree.Element('items')
+            item = create_item_for_page(items, 0, page, '', ':', None, [])
+            outfile.write(etree.tostring(item, encoding='utf-8'))
+        else:
+            outfile.writelines(iter_chunk([page], 0, 1, '', ':', None, []))
+        return peak_rss() - before
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--run':
+        print(export_page(sys.argv[2], sys.argv[3]))
+        return
+
+    size = int(float(sys.argv[1] if len(sys.argv) > 1 else 64) * 1024 * 1024)
+    with tempfile.TemporaryDirectory() as base_dir:
+        create_page(base_dir, size)
+        size = os.path.getsize(base_dir + '/data/pages/bench.txt')
+        print('Page size: %.1f MiB' % (size / 1024 / 1024))
+        for mode in ('str', 'bytes'):
+            output = subprocess.check_output(
+                [sys.executable, __file__, '--run', base_dir, mode])
+            copied = int(output)
+            print('%-5s path: %7.1f MiB peak increase, %.2f copies per page'
+                  % (mode, copied / 1024 / 1024, copied / size))
+
+
+if __name__ == '__main__':
+    main()
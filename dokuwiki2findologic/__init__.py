@@ -1,11 +1,25 @@
 import logging
+import os
+import shutil
 
 import click
 
 from dokuwiki2findologic.doku import DokuWiki
+from dokuwiki2findologic.export import Export
 import dokuwiki2findologic.logger as logger
-from dokuwiki2findologic.usergroup import discover_roles
-from dokuwiki2findologic.xml import write_xml_page
+from dokuwiki2findologic.shard import find_chunks, parse_shard, verify_chunks
+
+
+def validate_shard(ctx, param, value):
+    """
+    Converts the --shard option to a tuple of shard index and count.
+    """
+    if value is None:
+        return None
+    try:
+        return parse_shard(value)
+    except ValueError as error:
+        raise click.BadParameter(str(error))
 
 
 @click.command()
@@ -25,12 +39,29 @@ URL')
                    'into a hierarchical cat value.')
 @click.option('--usergroup-salt', '-s', default='',
               help='Salt that is appended to usergroup names before hashing.')
+@click.option('--prefetch-depth', '-d', default=16,
+              help='Number of pages whose files are read ahead while XML is ' +
+                   'being generated. Use 0 to disable prefetching.')
+@click.option('--prefetch-workers', '-w', default=4,
+              help='Number of threads reading page files ahead of time.')
+@click.option('--cache-dir', '-C', default=None,
+              type=click.Path(file_okay=False),
+              help='Directory in which serialized pages are cached, so ' +
+                   'unchanged pages are not serialized again.')
+@click.option('--cache-size', default=256,
+              help='Maximum size of the cache in MiB.')
+@click.option('--shard', default=None, callback=validate_shard,
+              help='Only export the I-th of N shards, given as I/N. Hosts ' +
+                   'exporting all shards of the same wiki together produce ' +
+                   'a complete export.')
 @click.option('--verbose', '-v', count=True,
               help='Enables debug logging, with each "v" increasing the log ' +
                    'level from WARN up to DEBUG.')
 @click.argument('dokuwiki_dir', type=click.Path(exists=True))
 def do_export(dokuwiki_dir, page_url_prefix, pages_per_file, output_dir,
-              exclude, cat_delimiter, cat_prefix, usergroup_salt, verbose):
+              exclude, cat_delimiter, cat_prefix, usergroup_salt,
+              prefetch_depth, prefetch_workers, cache_dir, cache_size, shard,
+              verbose):
     """Exports DokuWiki content to the FINDOLOGIC XML output format."""
     # Set log level according to verbosity setting.
     if verbose < 1:
@@ -43,34 +74,45 @@ def do_export(dokuwiki_dir, page_url_prefix, pages_per_file, output_dir,
         logger.set_level(logging.DEBUG)
 
     dokuwiki = DokuWiki(dokuwiki_dir)
-
-    # Remove excluded pages.
-    pages = []
-    for path, page in dokuwiki.pages.items():
-        exclude_page = False
-        for exclude_path in exclude:
-            if path.startswith(exclude_path):
-                exclude_page = True
-                break
-        if page.deleted:
-            exclude_page = True
-        if not exclude_page:
-            pages.append(page)
-
-    # Process roles and visibility.
-    roles = discover_roles(dokuwiki_dir, usergroup_salt)
-
-    def write_pages(bar=None):
-        for offset in range(0, len(pages), pages_per_file):
-            write_xml_page(output_dir, pages, offset,
-                           pages_per_file, page_url_prefix, cat_delimiter,
-                           cat_prefix, roles,
-                           lambda identifier, _:
-                           bar.update(identifier) if bar is not None else None)
+    export = Export(dokuwiki, page_url_prefix, pages_per_file, exclude,
+                    cat_delimiter, cat_prefix, usergroup_salt, prefetch_depth,
+                    prefetch_workers, cache_dir, cache_size * 1024 * 1024,
+                    shard)
 
     if verbose > 0:
-        write_pages()
+        export.write(output_dir)
     else:
-        with click.progressbar(length=len(dokuwiki.pages),
+        with click.progressbar(length=export.item_count,
                                label='Exporting') as progress_bar:
-            write_pages(progress_bar)
+            export.write(output_dir, lambda _, __: progress_bar.update(1))
+
+
+@click.command()
+@click.option('--merge-into', '-m', default=None,
+              type=click.Path(exists=True, file_okay=False),
+              help='Directory to which the XML files are copied if the ' +
+                   'export is complete.')
+@click.argument('output_dirs', nargs=-1, required=True,
+                type=click.Path(exists=True, file_okay=False))
+def verify_export(output_dirs, merge_into):
+    """
+    Checks that the XML files in the output directories, e.g. of several
+    shards, together form a complete export without gaps or duplicates.
+    """
+    chunk_paths = find_chunks(output_dirs)
+    problems = verify_chunks(chunk_paths)
+    for problem in problems:
+        click.echo(problem, err=True)
+    if problems:
+        raise click.ClickException('The export is incomplete or inconsistent.')
+
+    if merge_into is not None:
+        for chunk_path in chunk_paths:
+            target_path = os.path.join(merge_into, os.path.basename(chunk_path))
+            # Files of an output directory that is also the target are already
+            # in place.
+            if os.path.exists(target_path) and \
+                    os.path.samefile(chunk_path, target_path):
+                continue
+            shutil.copy(chunk_path, target_path)
+    click.echo('%d files verified.' % len(chunk_paths))
@@ -0,0 +1,172 @@
+from collections import OrderedDict
+import hashlib
+import os
+
+from dokuwiki2findologic.logger import logger
+
+# Increase when the serialized item format changes, to invalidate old entries.
+CACHE_VERSION = 1
+
+
+def fingerprint(*values):
+    """
+    Hashes values whose representation is deterministic, e.g. strings and
+    tuples, to detect changes of export options.
+
+    :return: The hash as a lowercase hex digest.
+    """
+    return hashlib.sha256(repr(values).encode('utf-8')).hexdigest()
+
+
+def roles_fingerprint(roles):
+    """
+    Hashes the names, usergroup hashes and access rules of roles, so a change
+    to the ACLs, users or salt invalidates cached items.
+
+    :param roles: The roles to hash.
+    :return: The hash as a lowercase hex digest.
+    """
+    return fingerprint(*[
+        (role.name, role.usergroup_hash,
+         tuple((rule['pattern'], rule['permission']) for rule in role.rules))
+        for role in sorted(roles, key=lambda role: role.name)])
+
+
+def _remove_if_exists(file_path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+class FragmentCache(object):
+    """
+    Persistent cache of serialized items, stored as one file per item in a
+    directory. Entries are keyed by the page path, the state of the page's
+    files, and a fingerprint of everything else that affects the item. Stale
+    entries are not removed explicitly, but evicted once the cache exceeds its
+    size limit, least recently used first.
+    """
+
+    def __init__(self, cache_dir, max_size, options_fingerprint):
+        """
+        :param cache_dir: Directory holding the cache files. Created if it does
+            not exist.
+        :param max_size: Maximum total size of the cached items in bytes.
+        :param options_fingerprint: Hash of the export options and roles, see
+            fingerprint() and roles_fingerprint().
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self._dir = cache_dir
+        self._max_size = max_size
+        self._fingerprint = fingerprint(CACHE_VERSION, options_fingerprint)
+        self._load_index()
+        self._evict()
+
+    def _load_index(self):
+        """
+        Reads the names and sizes of the cache files, ordered from least to most
+        recently used. Reading a file updates its access time, unless the file
+        system is mounted without access times, in which case the order falls
+        back to when the files were written. Temporary files left behind by
+        interrupted exports are included, so they are evicted as well.
+        """
+        entries = []
+        for entry in os.scandir(self._dir):
+            if entry.is_file() and entry.name.endswith(('.xml', '.tmp')):
+                stat = entry.stat()
+                entries.append((max(stat.st_atime_ns, stat.st_mtime_ns),
+                                entry.name, stat.st_size))
+        entries.sort()
+        self._entries = OrderedDict(
+            (name, size) for _, name, size in entries)
+        self._size = sum(self._entries.values())
+
+    def key(self, page):
+        """
+        Determines the key of a page's item. It uses the state of the page's
+        files from before their metadata was read, so a change that happens
+        afterwards can't be cached under the new state of the files.
+
+        :param page: The page whose item is cached.
+        :return: The cache key.
+        """
+        return fingerprint(self._fingerprint, page.path,
+                           page.loaded_file_stamp)
+
+    def contains(self, key):
+        """
+        :param key: The key of the item, see key().
+        :return: True if the item is cached, without reading it.
+        """
+        return key + '.xml' in self._entries
+
+    def open(self, key):
+        """
+        Opens a cached item for reading, so it can be streamed instead of being
+        read as a whole.
+
+        :param key: The key of the item, see key().
+        :return: The binary file holding the item, or None if it's not cached
+            or the file was removed in the meantime, e.g. by another export
+            sharing the cache directory.
+        """
+        file_name = key + '.xml'
+        if file_name not in self._entries:
+            return None
+        try:
+            cache_file = open(os.path.join(self._dir, file_name), 'rb')
+        except FileNotFoundError:
+            self._forget(file_name)
+            return None
+        self._entries.move_to_end(file_name)
+        return cache_file
+
+    def store(self, key, pieces):
+        """
+        Passes the pieces of a serialized item through, while writing them to
+        the cache. The item is only added once all pieces were consumed.
+
+        :param key: The key of the item, see key().
+        :param pieces: Iterable of bytes-like objects forming the item.
+        :return: Generator of the same pieces.
+        """
+        file_name = key + '.xml'
+        file_path = os.path.join(self._dir, file_name)
+        temp_path = '%s.%d.tmp' % (file_path, os.getpid())
+        complete = False
+        try:
+            with open(temp_path, 'wb') as cache_file:
+                for piece in pieces:
+                    cache_file.write(piece)
+                    yield piece
+                size = cache_file.tell()
+            try:
+                os.replace(temp_path, file_path)
+            except FileNotFoundError:
+                # Evicted by another export sharing the cache directory, so
+                # the item is simply not cached.
+                return
+            complete = True
+        finally:
+            if not complete:
+                _remove_if_exists(temp_path)
+
+        self._forget(file_name)
+        self._entries[file_name] = size
+        self._size += size
+        self._evict()
+
+    def _forget(self, file_name):
+        self._size -= self._entries.pop(file_name, 0)
+
+    def _evict(self):
+        """
+        Removes the least recently used items until the cache fits its size
+        limit.
+        """
+        while self._size > self._max_size and self._entries:
+            file_name, size = self._entries.popitem(last=False)
+            self._size -= size
+            _remove_if_exists(os.path.join(self._dir, file_name))
+            logger.debug('Evicted %s from the item cache.' % file_name)
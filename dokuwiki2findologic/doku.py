@@ -1,3 +1,4 @@
+import codecs
 from datetime import datetime
 from pathlib import Path
 import re
@@ -5,6 +6,29 @@ import re
 import os.path
 import phpserialize
 
+# Size of the slices in which UTF-8 validity is checked.
+VALIDATION_SLICE_SIZE = 1024 * 1024
+# Headings in DokuWiki syntax, used as a fallback for missing titles.
+HEADING_PATTERN = re.compile('^={2,6}(.*?)={2,6}', re.MULTILINE)
+HEADING_BYTES_PATTERN = re.compile(b'^={2,6}(.*?)={2,6}', re.MULTILINE)
+# Marks titles that have not been looked up yet, as None is a valid title.
+_UNRESOLVED = object()
+
+
+def validate_utf8(buffer):
+    """
+    Checks that a buffer contains valid UTF-8, decoding it in slices so no full
+    copy of it is created.
+
+    :param buffer: The bytes-like object to check.
+    :raise UnicodeDecodeError: If the buffer is not valid UTF-8.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    view = memoryview(buffer)
+    for start in range(0, len(view), VALIDATION_SLICE_SIZE):
+        decoder.decode(view[start:start + VALIDATION_SLICE_SIZE])
+    decoder.decode(b'', final=True)
+
 
 class Page(object):
     """Metadata and content of a single DokuWiki page."""
@@ -21,6 +45,7 @@ class Page(object):
             this to False.
         """
         self._text = None
+        self._text_bytes = None
         self._changes = None
         self.path = path
         self._lazy_load = lazy_load_content
@@ -36,7 +61,8 @@ class Page(object):
         if self._lazy_load:
             self.purge_text()
         else:
-            self._text = self._load_text()
+            self.purge_text()
+            self._text_bytes = self._load_text_bytes()
             self._load_changes()
 
     def purge_text(self):
@@ -45,6 +71,26 @@ class Page(object):
         trying to keep memory consumption low.
         """
         self._text = None
+        self._text_bytes = None
+
+    def release_text(self):
+        """
+        Purges the page text from memory if it is loaded lazily, so it is read
+        again when needed. Pages that load their content eagerly keep it.
+        """
+        if self._lazy_load:
+            self.purge_text()
+
+    def prefetch(self):
+        """
+        Reads the page text from storage ahead of time, so accessing it later
+        does not block on I/O. Meant to be called from a worker thread.
+
+        :return: The page itself.
+        """
+        if self._text is None and self._text_bytes is None:
+            self._text_bytes = self._load_text_bytes()
+        return self
 
     @property
     def text(self):
@@ -52,10 +98,27 @@ class Page(object):
         Returns the text content of the page. May be loaded lazily if onfigured
         to do so.
         """
-        if self._text is None and self._lazy_load:
-            self._text = self._load_text()
+        if self._text is None:
+            if self._text_bytes is not None:
+                self._text = str(self._text_bytes, 'utf-8')
+            elif self._lazy_load:
+                self._text = self._load_text()
         return self._text
 
+    @property
+    def text_bytes(self):
+        """
+        Returns the UTF-8 encoded text content of the page as a bytes-like
+        object, without decoding it. May be loaded lazily if configured to do
+        so.
+        """
+        if self._text_bytes is None:
+            if self._text is not None:
+                self._text_bytes = self._text.encode('utf-8')
+            elif self._lazy_load:
+                self._text_bytes = self._load_text_bytes()
+        return self._text_bytes
+
     @property
     def deleted(self):
         """
@@ -73,15 +136,18 @@ class Page(object):
         return len(self._changes) == 0 or self._changes[-1][2] == 'D'
 
     def _load_metadata(self):
-        metadata_file_path = self._base_dir + '/data/meta/' + \
-                             self.path.replace(':', '/') + '.meta'
+        # Taken before any file is read, so a change that happens while the page
+        # is being loaded or exported is detected by comparing stamps later.
+        self.loaded_file_stamp = self.file_stamp()
+        metadata_file_path = self._metadata_file_path()
         if not os.path.isfile(metadata_file_path):
             print(metadata_file_path)
             raise ValueError('The requested page does not exist.')
-        with open(metadata_file_path, 'r') as metadata_file:
-            metadata = phpserialize.loads(metadata_file.read().encode('utf-8'))
+        with open(metadata_file_path, 'rb') as metadata_file:
+            metadata = phpserialize.loads(metadata_file.read())
 
-        self.title = self._get_title(metadata)
+        self._metadata_title = self._get_title(metadata)
+        self._title = _UNRESOLVED
         self.description = self._get_description(metadata)
         self.creator = self._get_creator(metadata)
         self.contributors = self._get_contributors(metadata)
@@ -97,44 +163,68 @@ class Page(object):
             self._changes = []
             return
 
-        with open(change_file_path, 'r') as change_file:
+        with open(change_file_path, 'r', encoding='utf-8') as change_file:
             raw_changes = change_file.readlines()
         self._changes = [line.split('\t') for line in raw_changes]
 
-    def _get_title(self, metadata):
+    @property
+    def title(self):
         """
-        Retrieves the title from metadata. If none exists there, the first
-        heading of the content is used. If that one doesn't exist either, the
-        title is None.
+        Returns the title from metadata. If none exists there, the first heading
+        of the content is used. If that one doesn't exist either, the title is
+        None. The heading is only looked up once the title is accessed.
+        """
+        if self._title is _UNRESOLVED:
+            self._title = self._metadata_title
+            if self._title is None:
+                self._title = self._extract_title_from_content()
+        return self._title
 
-        :param metadata: The metadata file to read.
-        :return: Page title or None.
+    @staticmethod
+    def _get_title(metadata):
+        """
+        Retrieves the title from metadata, but only if it's not empty. It's
+        decoded, so it has the same type as titles taken from the content.
         """
         try:
-            title = metadata[b'current'].get('title', None)
-            if title is None:
-                title = self._extract_title_from_content()
-            return title
+            title = metadata[b'current'].get(b'title', None)
         except KeyError:
             return None
+        if isinstance(title, bytes):
+            title = title.decode('utf-8')
+        return title or None
 
     def _extract_title_from_content(self):
         """
         Extracts the content of the first heading in the content, to be used as
         a title. This should be done in case the metadata does not contain it.
+        Text that is already in memory is searched in place. Otherwise, the text
+        file is read line by line until the first heading, without keeping the
+        text in memory.
 
         :return: The text of the first heading in the content, or None if no
             headings are found.
         """
-        content = self.text.splitlines()
-        title = None
-        for line in content:
-            match_result = re.match('={2,6}(.*?)={2,6}', line)
-            if match_result is not None:
-                title = match_result.group(1).strip()
-                break
-        return title
+        if self._text_bytes is not None:
+            match_result = HEADING_BYTES_PATTERN.search(self._text_bytes)
+            if match_result is None:
+                return None
+            return match_result.group(1).decode('utf-8').strip()
+        if self._text is not None:
+            match_result = HEADING_PATTERN.search(self._text)
+            if match_result is None:
+                return None
+            return match_result.group(1).strip()
 
+        text_file_path = self._text_file_path()
+        if not os.path.isfile(text_file_path):
+            return None
+        with open(text_file_path, 'r', encoding='utf-8') as text_file:
+            for line in text_file:
+                match_result = HEADING_PATTERN.match(line)
+                if match_result is not None:
+                    return match_result.group(1).strip()
+        return None
 
     @staticmethod
     def _get_description(metadata):
@@ -195,18 +285,58 @@ class Page(object):
         else:
             return None
 
+    def file_stamp(self):
+        """
+        Identifies the stored state of the page by the modification times and
+        sizes of its metadata and text files, so changes can be detected
+        without reading them.
+
+        :return: Tuple of modification time in nanoseconds and size for each
+            file, with None in place of a missing text file.
+        """
+        stamp = []
+        for file_path in (self._metadata_file_path(), self._text_file_path()):
+            try:
+                stat = os.stat(file_path)
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _metadata_file_path(self):
+        return self._base_dir + '/data/meta/' + self.path.replace(
+            ':', '/') + '.meta'
+
+    def _text_file_path(self):
+        return self._base_dir + '/data/pages/' + self.path.replace(
+            ':', '/') + '.txt'
+
     def _load_text(self):
         """
         Loads the page text from the file system. If it does not exist, the text
         is empty.
         """
-        text_file_path = self._base_dir + '/data/pages/' + self.path.replace(
-            ':', '/') + '.txt'
+        text_file_path = self._text_file_path()
         if not os.path.isfile(text_file_path):
             return ''
-        with open(text_file_path, 'r') as text_file:
+        with open(text_file_path, 'r', encoding='utf-8') as text_file:
             return text_file.read()
 
+    def _load_text_bytes(self):
+        """
+        Loads the UTF-8 encoded page text from the file system without decoding
+        it. The file is read into memory rather than mapped, so the text stays
+        intact and accessible if the file is changed or truncated afterwards.
+        If the file does not exist, the text is empty.
+        """
+        text_file_path = self._text_file_path()
+        if not os.path.isfile(text_file_path):
+            return b''
+        with open(text_file_path, 'rb') as text_file:
+            text = text_file.read()
+        validate_utf8(text)
+        return text
+
     def __repr__(self):
         return '[%s(%s)]' % (self.path, self.title)
 
@@ -222,6 +352,14 @@ class DokuWiki(object):
         self._lazy_load = lazy_load_content
         self.reload()
 
+    @property
+    def base_dir(self):
+        """
+        The base directory of the DokuWiki install, which contains the ``conf``
+        and ``data`` directories.
+        """
+        return self._base_dir
+
     def reload(self):
         """
         Purges the DokuWiki data cached in-memory and re-read everything from
@@ -0,0 +1,293 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import asyncio
+
+from dokuwiki2findologic.cache import FragmentCache, fingerprint, \
+    roles_fingerprint
+from dokuwiki2findologic.prefetch import prefetched
+from dokuwiki2findologic.shard import shard_offsets
+from dokuwiki2findologic.usergroup import discover_roles
+from dokuwiki2findologic.xml import chunk_file_name, iter_chunk, iter_items, \
+    needs_serialization, write_xml_page
+
+
+def select_pages(dokuwiki, exclude=(), executor=None):
+    """
+    Lists the pages that should be exported, which are all pages that are
+    neither deleted nor located below one of the excluded path prefixes. The
+    pages are ordered by path, so the order does not depend on the file system
+    and is the same on every host.
+
+    :param dokuwiki: The DokuWiki instance to export.
+    :param exclude: Path prefixes of pages that should not be exported.
+    :param executor: Optional executor used to read the change histories,
+        which tell whether pages are deleted, concurrently.
+    :return: List of pages to export.
+    """
+    candidates = []
+    for path, page in sorted(dokuwiki.pages.items()):
+        exclude_page = False
+        for exclude_path in exclude:
+            if path.startswith(exclude_path):
+                exclude_page = True
+                break
+        if not exclude_page:
+            candidates.append(page)
+
+    if executor is None:
+        deleted = [page.deleted for page in candidates]
+    else:
+        deleted = executor.map(lambda page: page.deleted, candidates)
+    return [page for page, page_deleted in zip(candidates, deleted)
+            if not page_deleted]
+
+
+class Export(object):
+    """
+    Converts the pages of a DokuWiki instance to FINDOLOGIC XML, without
+    depending on the file system as output. This allows streaming the export
+    to other destinations, e.g. directly into an upload.
+    """
+
+    def __init__(self, dokuwiki, page_url_prefix='', pages_per_file=20,
+                 exclude=(), cat_delimiter=':', cat_prefix=None,
+                 usergroup_salt='', prefetch_depth=16, prefetch_workers=4,
+                 cache_dir=None, cache_size=256 * 1024 * 1024, shard=None):
+        """
+        The options correspond to those of the command line interface.
+
+        :param dokuwiki: The DokuWiki instance to export.
+        :param page_url_prefix: The page path is appended to this value to
+            create a proper URL.
+        :param pages_per_file: Number of pages in a single chunk.
+        :param exclude: Path prefixes of pages that should not be exported.
+        :param cat_delimiter: Separator in the page path.
+        :param cat_prefix: Prefix that is removed from the path before turning
+            it into a hierarchical cat value.
+        :param usergroup_salt: Salt that is appended to usergroup names before
+            hashing.
+        :param prefetch_depth: Number of pages whose files are read ahead while
+            XML is being generated. Use 0 to disable prefetching.
+        :param prefetch_workers: Number of threads reading page files ahead of
+            time.
+        :param cache_dir: Optional directory in which serialized items are
+            cached, so unchanged pages don't need to be serialized again.
+        :param cache_size: Maximum size of the cache in bytes.
+        :param shard: Optional tuple of the zero-based shard index and the
+            number of shards, to export only the chunks assigned to that shard.
+            See parse_shard().
+        """
+        self.page_url_prefix = page_url_prefix
+        self.pages_per_file = pages_per_file
+        self.cat_delimiter = cat_delimiter
+        self.cat_prefix = cat_prefix
+        self.prefetch_depth = prefetch_depth
+        self.prefetch_workers = prefetch_workers
+        self.shard = shard
+        with self._executor() as executor:
+            self.pages = select_pages(dokuwiki, exclude, executor)
+        # Role names are collected in a set, whose order varies between runs.
+        # Sorting them keeps the usergroups of each item in a stable order.
+        self.roles = sorted(discover_roles(dokuwiki.base_dir, usergroup_salt),
+                            key=lambda role: role.name)
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = FragmentCache(
+                cache_dir, cache_size,
+                fingerprint(page_url_prefix, cat_delimiter, cat_prefix,
+                            roles_fingerprint(self.roles)))
+
+    @property
+    def offsets(self):
+        """
+        The offsets at which the chunks of the selected shard start.
+        """
+        return shard_offsets(range(0, len(self.pages), self.pages_per_file),
+                             self.shard)
+
+    @property
+    def item_count(self):
+        """
+        The number of items in the chunks of the selected shard.
+        """
+        return sum(len(self.pages[offset:offset + self.pages_per_file])
+                   for offset in self.offsets)
+
+    def _executor(self):
+        return ThreadPoolExecutor(max_workers=max(self.prefetch_workers, 1))
+
+    def _chunk_size(self, offset):
+        return len(self.pages[offset:offset + self.pages_per_file])
+
+    def _prefetched_pages(self, executor):
+        """
+        Reads the pages of all chunks of the selected shard ahead of time in a
+        single pipeline, so reading continues across chunk boundaries. Pages
+        whose items are cached are not read.
+        """
+        pages = (page for offset in self.offsets
+                 for page in self.pages[offset:offset + self.pages_per_file])
+        return prefetched(pages, executor, self.prefetch_depth,
+                          needs_serialization(self.cache))
+
+    def items(self):
+        """
+        Serializes the pages of the selected shard one by one.
+
+        :return: Generator of UTF-8 encoded ``<item>`` elements.
+        """
+        with self._executor() as executor:
+            source = self._prefetched_pages(executor)
+            try:
+                for offset in self.offsets:
+                    pages = islice(source, self._chunk_size(offset))
+                    for pieces in iter_items(pages, offset,
+                                             self.page_url_prefix,
+                                             self.cat_delimiter,
+                                             self.cat_prefix, self.roles,
+                                             None, self.cache):
+                        yield b''.join(pieces)
+            finally:
+                source.close()
+
+    def chunk_streams(self):
+        """
+        Serializes the pages as complete XML documents of up to pages_per_file
+        items each, just like the files written by write(). Each document is
+        streamed piece by piece, so it never has to be held in memory as a
+        whole. The documents share one page pipeline, so any part of a
+        document that was not consumed before advancing to the next one is
+        generated and discarded.
+
+        :return: Generator of tuples containing the file name of the chunk and
+            an iterator of bytes-like objects forming the UTF-8 encoded
+            document.
+        """
+        with self._executor() as executor:
+            source = self._prefetched_pages(executor)
+            try:
+                for offset in self.offsets:
+                    pieces = self._iter_chunk(offset, source)
+                    yield chunk_file_name(offset, self.pages_per_file), pieces
+                    for _ in pieces:
+                        pass
+            finally:
+                source.close()
+
+    def chunks(self):
+        """
+        Like chunk_streams(), but joins each document into a single byte string
+        for convenience.
+
+        :return: Generator of tuples containing the file name of the chunk and
+            the UTF-8 encoded document.
+        """
+        for file_name, pieces in self.chunk_streams():
+            yield file_name, b''.join(pieces)
+
+    def write(self, output_dir, on_finish=None):
+        """
+        Writes the chunks of the selected shard to XML files.
+
+        :param output_dir: Where to write XML files to. The directory must
+            exist.
+        :param on_finish: Optional function to call once a page has been
+            processed.
+        """
+        with self._executor() as executor:
+            source = self._prefetched_pages(executor)
+            try:
+                for offset in self.offsets:
+                    write_xml_page(output_dir, self.pages, offset,
+                                   self.pages_per_file, self.page_url_prefix,
+                                   self.cat_delimiter, self.cat_prefix,
+                                   self.roles, on_finish, cache=self.cache,
+                                   source=source)
+            finally:
+                source.close()
+
+    def aitems(self, executor=None):
+        """
+        Asynchronous variant of items(). File reads and XML generation are
+        offloaded to an executor, so the event loop is not blocked.
+
+        :param executor: The executor to use, or None for the event loop's
+            default executor.
+        :return: Asynchronous iterator of UTF-8 encoded ``<item>`` elements.
+        """
+        return AsyncIterator(self.items(), executor)
+
+    def achunks(self, executor=None):
+        """
+        Asynchronous variant of chunks(). File reads and XML generation are
+        offloaded to an executor, so the event loop is not blocked.
+
+        :param executor: The executor to use, or None for the event loop's
+            default executor.
+        :return: Asynchronous iterator of tuples containing the file name of
+            the chunk and the UTF-8 encoded document.
+        """
+        return AsyncIterator(self.chunks(), executor)
+
+    def achunk_streams(self, executor=None):
+        """
+        Asynchronous variant of chunk_streams(). File reads and XML generation
+        are offloaded to an executor, so the event loop is not blocked.
+
+        :param executor: The executor to use, or None for the event loop's
+            default executor.
+        :return: Asynchronous iterator of tuples containing the file name of
+            the chunk and an asynchronous iterator of bytes-like objects forming
+            the UTF-8 encoded document.
+        """
+        return AsyncIterator(self.chunk_streams(), executor,
+                             lambda chunk: (chunk[0], AsyncIterator(chunk[1],
+                                                                    executor)))
+
+    def _iter_chunk(self, offset, source):
+        return iter_chunk(self.pages, offset, self.pages_per_file,
+                          self.page_url_prefix, self.cat_delimiter,
+                          self.cat_prefix, self.roles, cache=self.cache,
+                          source=source)
+
+
+class AsyncIterator(object):
+    """
+    Wraps a blocking iterator, advancing it in an executor.
+    """
+
+    _exhausted = object()
+
+    def __init__(self, iterator, executor=None, convert=None):
+        """
+        :param iterator: The blocking iterator.
+        :param executor: The executor to use, or None for the event loop's
+            default executor.
+        :param convert: Optional function applied to each value.
+        """
+        self._iterator = iterator
+        self._executor = executor
+        self._convert = convert
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        loop = asyncio.get_event_loop()
+        value = await loop.run_in_executor(self._executor, next,
+                                           self._iterator, self._exhausted)
+        if value is self._exhausted:
+            raise StopAsyncIteration
+        if self._convert is not None:
+            value = self._convert(value)
+        return value
+
+    async def aclose(self):
+        """
+        Stops the iteration early and releases the wrapped iterator's
+        resources.
+        """
+        close = getattr(self._iterator, 'close', None)
+        if close is not None:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(self._executor, close)
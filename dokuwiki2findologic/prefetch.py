@@ -0,0 +1,61 @@
+from collections import deque
+from concurrent.futures import Future
+from itertools import islice
+import time
+
+from dokuwiki2findologic.logger import logger
+
+
+def prefetched(pages, executor, depth, should_prefetch=None):
+    """
+    Yields pages in their original order, while the files of upcoming pages are
+    read by the executor's worker threads. This way, the caller can build and
+    serialize XML for one page while the next ones are loaded from storage.
+
+    At most ``depth`` pages are being read or waiting to be consumed at any
+    time. Once the caller advances past a page, its text is released, so memory
+    consumption stays capped regardless of the number of pages.
+
+    :param pages: The pages to prefetch.
+    :param executor: A concurrent.futures executor that runs the reads. If it's
+        None, pages are yielded without prefetching.
+    :param depth: Maximum number of pages read ahead. Values below 1 disable
+        prefetching.
+    :param should_prefetch: Optional function that decides whether a page's
+        files need to be read. Other pages are passed through as they are.
+    """
+    if executor is None or depth < 1:
+        for page in pages:
+            try:
+                yield page
+            finally:
+                page.release_text()
+        return
+
+    def submit(page):
+        if should_prefetch is None or should_prefetch(page):
+            return executor.submit(page.prefetch)
+        future = Future()
+        future.set_result(page)
+        return future
+
+    pages = iter(pages)
+    pending = deque(submit(page) for page in islice(pages, depth))
+    wait_time = 0.0
+    try:
+        while pending:
+            future = pending.popleft()
+            started = time.perf_counter()
+            page = future.result()
+            wait_time += time.perf_counter() - started
+            # Keep the queue filled before handing the page to the consumer.
+            for next_page in islice(pages, 1):
+                pending.append(submit(next_page))
+            try:
+                yield page
+            finally:
+                page.release_text()
+    finally:
+        for future in pending:
+            future.cancel()
+        logger.debug('Waited %.3fs for prefetched pages.' % wait_time)
@@ -0,0 +1,169 @@
+import os
+import re
+
+from lxml import etree
+
+CHUNK_FILE_PATTERN = re.compile(r'^findologic_(\d+)_(\d+)\.xml$')
+
+
+def parse_shard(value):
+    """
+    Parses a shard specification of the form ``I/N``, which selects the I-th of
+    N shards, counting from 1.
+
+    :param value: The shard specification.
+    :return: Tuple of the zero-based shard index and the number of shards.
+    :raise ValueError: If the specification is malformed or out of range.
+    """
+    match = re.match(r'^\s*(\d+)\s*/\s*(\d+)\s*$', value)
+    if match is None:
+        raise ValueError('Shards must be specified as I/N, e.g. 2/4.')
+    index, count = int(match.group(1)), int(match.group(2))
+    if not 1 <= index <= count:
+        raise ValueError('The shard number must be between 1 and %d.' %
+                         count)
+    return index - 1, count
+
+
+def shard_offsets(offsets, shard):
+    """
+    Assigns chunks to a shard round-robin, so all shards get a similar amount
+    of work. Every host has to use the same page order for this to be
+    consistent.
+
+    :param offsets: The offsets of all chunks.
+    :param shard: Tuple of the zero-based shard index and the number of shards,
+        or None to select all chunks.
+    :return: List of the offsets of chunks belonging to the shard.
+    """
+    if shard is None:
+        return list(offsets)
+    index, count = shard
+    return [offset for position, offset in enumerate(offsets)
+            if position % count == index]
+
+
+def _integer_attribute(element, name):
+    """
+    :param element: The element holding the attribute.
+    :param name: Name of the attribute.
+    :return: The attribute's value as an integer.
+    :raise ValueError: If the attribute is missing or not a non-negative
+        integer.
+    """
+    value = element.get(name)
+    if value is None or re.match(r'^[0-9]+$', value) is None:
+        raise ValueError('<%s> has no valid %s attribute: %r' % (
+            element.tag, name, value))
+    return int(value)
+
+
+def read_chunk(chunk_path):
+    """
+    Reads the range information and item IDs of an export file without
+    keeping its content in memory.
+
+    :param chunk_path: Path of the export file.
+    :return: Tuple of the ``items`` element's ``start``, ``count`` and
+        ``total`` attributes as a dictionary of integers, or None if there is
+        no such element, and the list of item IDs in document order.
+    :raise lxml.etree.XMLSyntaxError: If the file is not valid XML.
+    :raise ValueError: If an attribute or ID is missing or not an integer.
+    """
+    attributes = None
+    identifiers = []
+    for _, element in etree.iterparse(chunk_path, events=('end',),
+                                      tag=('item', 'items'), huge_tree=True):
+        if element.tag == 'item':
+            identifiers.append(_integer_attribute(element, 'id'))
+            element.clear()
+        else:
+            attributes = dict((name, _integer_attribute(element, name))
+                              for name in ('start', 'count', 'total'))
+    return attributes, identifiers
+
+
+def find_chunks(output_dirs):
+    """
+    :param output_dirs: Directories containing export files.
+    :return: Sorted list of the paths of all export files in the directories.
+    """
+    chunk_paths = []
+    for output_dir in output_dirs:
+        for file_name in os.listdir(output_dir):
+            if CHUNK_FILE_PATTERN.match(file_name) is not None:
+                chunk_paths.append(os.path.join(output_dir, file_name))
+    return sorted(chunk_paths)
+
+
+def verify_chunks(chunk_paths):
+    """
+    Checks that export files, e.g. written by several shards, together form a
+    complete export: all files agree on the total, each file holds the items
+    its name and range promise, and every item ID from 0 up to the total
+    occurs exactly once.
+
+    :param chunk_paths: Paths of the export files to check.
+    :return: List of problem descriptions, which is empty if the export is
+        complete.
+    """
+    if not chunk_paths:
+        return ['No export files were found.']
+
+    problems = []
+    totals = set()
+    chunk_sizes = set()
+    seen = {}
+    for chunk_path in chunk_paths:
+        file_name = os.path.basename(chunk_path)
+        offset, count = map(int, CHUNK_FILE_PATTERN.match(file_name).groups())
+        try:
+            attributes, identifiers = read_chunk(chunk_path)
+        except etree.XMLSyntaxError as error:
+            problems.append('%s is not valid XML: %s' % (chunk_path, error))
+            continue
+        except ValueError as error:
+            problems.append('%s is a malformed file: %s' % (chunk_path, error))
+            continue
+        if attributes is None:
+            problems.append('%s has no items element.' % chunk_path)
+            continue
+
+        totals.add(attributes['total'])
+        chunk_sizes.add(count)
+        if attributes['start'] != offset or attributes['count'] != count:
+            problems.append('%s does not match its range %d-%d.' % (
+                chunk_path, attributes['start'], attributes['count']))
+        if identifiers != list(range(offset, offset + len(identifiers))) or \
+                len(identifiers) > count:
+            problems.append('%s contains items outside of its range.' %
+                            chunk_path)
+
+        for identifier in identifiers:
+            if identifier in seen:
+                problems.append('Item %d is in both %s and %s.' % (
+                    identifier, seen[identifier], chunk_path))
+            else:
+                seen[identifier] = chunk_path
+
+    if not totals:
+        problems.append('The total could not be determined from any file.')
+    if len(totals) > 1:
+        problems.append('The files disagree on the total: %s.' %
+                        ', '.join(str(total) for total in sorted(totals)))
+    if len(chunk_sizes) > 1:
+        problems.append('The files use different numbers of pages per file: '
+                        '%s.' % ', '.join(str(size)
+                                          for size in sorted(chunk_sizes)))
+    if len(totals) == 1:
+        total = totals.pop()
+        missing = sorted(set(range(total)) - set(seen))
+        if missing:
+            problems.append('%d items are missing, starting at item %d.' % (
+                len(missing), missing[0]))
+        extra = sorted(identifier for identifier in seen
+                       if identifier >= total)
+        if extra:
+            problems.append('%d items exceed the total, starting at item %d.'
+                            % (len(extra), extra[0]))
+    return problems
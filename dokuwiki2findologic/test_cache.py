@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from dokuwiki2findologic.cache import FragmentCache
+from dokuwiki2findologic.doku import DokuWiki
+from dokuwiki2findologic.export import Export
+from dokuwiki2findologic.test_export import make_wiki
+from dokuwiki2findologic.xml import CACHE_BLOCK_SIZE, iter_items
+
+
+class TestFragmentCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.wiki_dir = self.tmp_dir.name + '/wiki'
+        self.cache_dir = self.tmp_dir.name + '/cache'
+        make_wiki(self.wiki_dir, {
+            'docs:intro': '====== Intro ======\nWelcome',
+            'docs:setup': 'Setup & more',
+            'empty': None
+        })
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def export(self, **options):
+        return list(Export(DokuWiki(self.wiki_dir), pages_per_file=2,
+                           cache_dir=self.cache_dir, **options).chunks())
+
+    def test_cached_export_matches_uncached_export(self):
+        uncached = list(Export(DokuWiki(self.wiki_dir),
+                               pages_per_file=2).chunks())
+        self.assertEqual(uncached, self.export())
+        self.assertEqual(3, len(os.listdir(self.cache_dir)))
+        self.assertEqual(uncached, self.export())
+
+    def test_changed_pages_are_serialized_again(self):
+        self.export()
+        text_path = self.wiki_dir + '/data/pages/docs/setup.txt'
+        with open(text_path, 'w', encoding='utf-8') as text_file:
+            text_file.write('Completely new setup instructions')
+        chunks = self.export()
+        self.assertIn(b'Completely new setup instructions',
+                      b''.join(data for _, data in chunks))
+
+    def test_metadata_changed_during_export_is_not_cached(self):
+        dokuwiki = DokuWiki(self.wiki_dir)
+        make_wiki(self.wiki_dir, {'docs:intro': 'Welcome'},
+                  {'docs:intro': 'Changed title'})
+        list(Export(dokuwiki, cache_dir=self.cache_dir).chunks())
+        chunks = self.export()
+        self.assertIn(b'Changed title', b''.join(data for _, data in chunks))
+
+    def test_changed_options_invalidate_items(self):
+        self.export()
+        chunks = self.export(page_url_prefix='https://wiki/')
+        self.assertIn(b'https://wiki/docs:intro',
+                      b''.join(data for _, data in chunks))
+
+    def test_items_removed_during_export_are_serialized_again(self):
+        uncached = self.export()
+        export = Export(DokuWiki(self.wiki_dir), pages_per_file=2,
+                        cache_dir=self.cache_dir)
+        for name in os.listdir(self.cache_dir):
+            os.remove(os.path.join(self.cache_dir, name))
+        self.assertEqual(uncached, list(export.chunks()))
+        self.assertEqual(3, len(os.listdir(self.cache_dir)))
+
+    def test_large_items_are_streamed_from_the_cache(self):
+        make_wiki(self.wiki_dir, {'docs:setup': 'x' * (1024 * 1024)})
+        self.export()
+        export = Export(DokuWiki(self.wiki_dir), pages_per_file=2,
+                        cache_dir=self.cache_dir)
+        with mock.patch('dokuwiki2findologic.xml.serialize_item_pieces',
+                        side_effect=AssertionError('Item was not cached.')):
+            for pieces in iter_items(export.pages, 0, '', ':', None,
+                                     export.roles, cache=export.cache):
+                self.assertLessEqual(max(len(piece) for piece in pieces),
+                                     CACHE_BLOCK_SIZE)
+
+    def test_stale_temporary_files_are_evicted(self):
+        os.mkdir(self.cache_dir)
+        temp_path = os.path.join(self.cache_dir, 'item.xml.123.tmp')
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(b'x' * 100)
+        FragmentCache(self.cache_dir, 10, '')
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_least_recently_used_items_are_evicted(self):
+        self.export()
+        sizes = [os.path.getsize(os.path.join(self.cache_dir, name))
+                 for name in os.listdir(self.cache_dir)]
+        FragmentCache(self.cache_dir, max(sizes), '')
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
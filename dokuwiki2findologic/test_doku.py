@@ -1,5 +1,10 @@
+import tempfile
 import unittest
 
+from dokuwiki2findologic.doku import DokuWiki
+from dokuwiki2findologic.test_export import make_wiki
+from dokuwiki2findologic.xml import serialize_item
+
 
 class TestDokuWiki(unittest.TestCase):
     def test_pages_are_loaded(self):
@@ -14,7 +19,28 @@ class TestPage(unittest.TestCase):
         pass
 
     def test_missing_title_is_handled_gracefully(self):
-        pass
+        with tempfile.TemporaryDirectory() as wiki_dir:
+            make_wiki(wiki_dir, {'no_heading': 'Text', 'no_text': None})
+            dokuwiki = DokuWiki(wiki_dir)
+            self.assertIsNone(dokuwiki.pages['no_heading'].title)
+            self.assertIsNone(dokuwiki.pages['no_text'].title)
+
+    def test_title_is_read_from_metadata(self):
+        with tempfile.TemporaryDirectory() as wiki_dir:
+            make_wiki(wiki_dir, {'page': '===== Heading =====\n'},
+                      {'page': 'Title'})
+            self.assertEqual('Title', DokuWiki(wiki_dir).pages['page'].title)
+
+    def test_title_falls_back_to_first_heading_lazily(self):
+        with tempfile.TemporaryDirectory() as wiki_dir:
+            make_wiki(wiki_dir, {
+                'page': 'Intro\n==== First ====\n\n== Second ==\n'
+            })
+            page = DokuWiki(wiki_dir).pages['page']
+            self.assertIsNone(page._text)
+            self.assertEqual('First', page.title)
+            self.assertIsNone(page._text)
+            self.assertIsNone(page._text_bytes)
 
     def test_missing_contributors_are_handled_gracefully(self):
         pass
@@ -27,3 +53,14 @@ class TestPage(unittest.TestCase):
 
     def test_text_lazy_loading(self):
         pass
+
+    def test_prefetched_text_survives_truncation(self):
+        text = 'x' * (2 * 1024 * 1024)
+        with tempfile.TemporaryDirectory() as wiki_dir:
+            make_wiki(wiki_dir, {'page': text})
+            page = DokuWiki(wiki_dir).pages['page']
+            page.prefetch()
+            with open(wiki_dir + '/data/pages/page.txt', 'r+b') as text_file:
+                text_file.truncate(0)
+            item = serialize_item(0, page, '', ':', None, [])
+            self.assertIn(text.encode('utf-8'), item)
@@ -0,0 +1,183 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from lxml import etree
+import phpserialize
+
+from dokuwiki2findologic.doku import DokuWiki
+from dokuwiki2findologic.export import Export
+from dokuwiki2findologic.prefetch import prefetched
+
+
+def make_wiki(base_dir, pages, titles=None):
+    """
+    Creates a minimal DokuWiki directory structure for testing.
+
+    :param base_dir: The directory to create the wiki in.
+    :param pages: Dictionary mapping page paths to their text, or to None for
+        pages without a text file.
+    :param titles: Optional dictionary mapping page paths to the title stored
+        in their metadata.
+    """
+    titles = titles or {}
+    os.makedirs(base_dir + '/conf', exist_ok=True)
+    with open(base_dir + '/conf/users.auth.php', 'w') as users_file:
+        users_file.write('admin:x:Admin:admin@example.com:admin,user\n')
+    with open(base_dir + '/conf/acl.auth.php', 'w') as acl_file:
+        acl_file.write('*\t@ALL\t1\nsecret:*\t@ALL\t0\nsecret:*\t@admin\t8\n')
+
+    for path, text in pages.items():
+        file_path = path.replace(':', '/')
+        meta_path = base_dir + '/data/meta/' + file_path
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        current = {}
+        if path in titles:
+            current[b'title'] = titles[path].encode('utf-8')
+        metadata = {
+            b'current': current,
+            b'persistent': {b'creator': b'Admin',
+                            b'date': {b'created': 1500000000,
+                                      b'modified': 1500001000}}
+        }
+        with open(meta_path + '.meta', 'wb') as metadata_file:
+            metadata_file.write(phpserialize.dumps(metadata))
+        with open(meta_path + '.changes', 'w') as change_file:
+            change_file.write('1500000000\t127.0.0.1\tC\t%s\tadmin\t\n' % path)
+
+        if text is not None:
+            text_path = base_dir + '/data/pages/' + file_path + '.txt'
+            os.makedirs(os.path.dirname(text_path), exist_ok=True)
+            with open(text_path, 'w', encoding='utf-8') as text_file:
+                text_file.write(text)
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.wiki_dir = self.tmp_dir.name + '/wiki'
+        make_wiki(self.wiki_dir, {
+            'docs:intro': '====== Intro ======\nWelcome & <hello>',
+            'docs:setup': 'Setup in äöü',
+            'secret:plans': 'Top secret',
+            'empty': None
+        })
+        self.export = Export(DokuWiki(self.wiki_dir), 'https://wiki/',
+                             pages_per_file=3)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_items_are_standalone_elements(self):
+        items = [etree.fromstring(item) for item in self.export.items()]
+        self.assertEqual(['0', '1', '2', '3'],
+                         [item.get('id') for item in items])
+        urls = {item.findtext('urls/url') for item in items}
+        self.assertIn('https://wiki/docs:setup', urls)
+
+    def test_chunks_match_written_files(self):
+        output_dir = self.tmp_dir.name + '/out'
+        os.mkdir(output_dir)
+        self.export.write(output_dir)
+
+        chunks = list(self.export.chunks())
+        self.assertEqual(['findologic_0_3.xml', 'findologic_3_3.xml'],
+                         [name for name, _ in chunks])
+        for name, data in chunks:
+            with open(output_dir + '/' + name, 'rb') as chunk_file:
+                self.assertEqual(chunk_file.read(), data)
+            document = etree.fromstring(data)
+            self.assertEqual('4', document.find('items').get('total'))
+
+    def test_pages_are_prefetched_across_chunks(self):
+        output_dir = self.tmp_dir.name + '/out'
+        os.mkdir(output_dir)
+        with mock.patch('dokuwiki2findologic.export.prefetched',
+                        wraps=prefetched) as pipeline:
+            self.export.write(output_dir)
+        self.assertEqual(1, pipeline.call_count)
+        self.assertEqual(2, len(os.listdir(output_dir)))
+
+    def test_failed_chunk_leaves_no_file(self):
+        output_dir = self.tmp_dir.name + '/out'
+        os.mkdir(output_dir)
+        with open(self.wiki_dir + '/data/pages/docs/setup.txt', 'w') as text:
+            text.write('Bell \x07')
+        with self.assertRaises(ValueError):
+            self.export.write(output_dir)
+        self.assertEqual([], os.listdir(output_dir))
+
+    def test_chunks_can_be_streamed_piece_by_piece(self):
+        chunks = self.export.chunks()
+        for file_name, pieces in self.export.chunk_streams():
+            data = bytearray()
+            piece_count = 0
+            for piece in pieces:
+                data += piece
+                piece_count += 1
+            self.assertGreater(piece_count, 2)
+            self.assertEqual(next(chunks), (file_name, bytes(data)))
+
+    def test_unconsumed_chunk_streams_are_skipped(self):
+        streams = self.export.chunk_streams()
+        next(streams)
+        file_name, pieces = next(streams)
+        self.assertEqual(list(self.export.chunks())[1],
+                         (file_name, b''.join(pieces)))
+
+    def test_async_chunk_streams_match_chunks(self):
+        async def collect():
+            chunks = []
+            async for file_name, pieces in self.export.achunk_streams():
+                data = b''
+                async for piece in pieces:
+                    data += piece
+                chunks.append((file_name, data))
+            return chunks
+
+        loop = asyncio.new_event_loop()
+        try:
+            chunks = loop.run_until_complete(collect())
+        finally:
+            loop.close()
+        self.assertEqual(list(self.export.chunks()), chunks)
+
+    def test_usergroups_do_not_depend_on_hash_seed(self):
+        with open(self.wiki_dir + '/conf/users.auth.php', 'a') as users_file:
+            users_file.write('dev:x:Dev:dev@example.com:dev,ops,qa,docs\n')
+        with open(self.wiki_dir + '/conf/acl.auth.php', 'a') as acl_file:
+            for role_name in ('dev', 'ops', 'qa', 'docs'):
+                acl_file.write('secret:*\t@%s\t1\n' % role_name)
+        script = ('import sys\n'
+                  'from dokuwiki2findologic.doku import DokuWiki\n'
+                  'from dokuwiki2findologic.export import Export\n'
+                  'for item in Export(DokuWiki(sys.argv[1])).items():\n'
+                  '    sys.stdout.buffer.write(item)\n')
+        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        outputs = []
+        for seed in ('1', '2'):
+            environment = dict(os.environ, PYTHONHASHSEED=seed,
+                               PYTHONPATH=root_dir)
+            outputs.append(subprocess.check_output(
+                [sys.executable, '-c', script, self.wiki_dir],
+                env=environment))
+        self.assertIn(b'<usergroup>', outputs[0])
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_async_variant_yields_the_same_items(self):
+        async def collect():
+            items = []
+            async for item in self.export.aitems():
+                items.append(item)
+            return items
+
+        loop = asyncio.new_event_loop()
+        try:
+            items = loop.run_until_complete(collect())
+        finally:
+            loop.close()
+        self.assertEqual(list(self.export.items()), items)
@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+import unittest
+
+from dokuwiki2findologic.prefetch import prefetched
+
+
+class FakePage(object):
+    def __init__(self, path, log):
+        self.path = path
+        self.log = log
+
+    def prefetch(self):
+        self.log.append(self.path)
+        self.text = self.path
+        return self
+
+    def release_text(self):
+        self.text = None
+
+
+class TestPrefetching(unittest.TestCase):
+    def test_pages_are_yielded_in_order(self):
+        log = []
+        pages = [FakePage(str(i), log) for i in range(50)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            result = list(prefetched(pages, executor, 8))
+        self.assertEqual(pages, result)
+        self.assertEqual(sorted(page.path for page in pages), sorted(log))
+
+    def test_read_ahead_is_bounded_by_depth(self):
+        log = []
+        pages = [FakePage(str(i), log) for i in range(50)]
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            iterator = prefetched(pages, executor, 3)
+            next(iterator)
+            executor.submit(lambda: None).result()
+            self.assertLessEqual(len(log), 4)
+            iterator.close()
+
+    def test_prefetching_can_be_disabled(self):
+        log = []
+        pages = [FakePage(str(i), log) for i in range(5)]
+        self.assertEqual(pages, list(prefetched(pages, None, 8)))
+        self.assertEqual([], log)
+
+    def test_text_is_released_after_page_is_consumed(self):
+        pages = [FakePage(str(i), []) for i in range(5)]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for page in prefetched(pages, executor, 2):
+                self.assertEqual(page.path, page.text)
+        self.assertEqual([None] * 5, [page.text for page in pages])
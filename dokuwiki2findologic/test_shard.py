@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from dokuwiki2findologic.doku import DokuWiki
+from dokuwiki2findologic.export import Export
+from dokuwiki2findologic.shard import find_chunks, parse_shard, \
+    shard_offsets, verify_chunks
+from dokuwiki2findologic.test_export import make_wiki
+
+
+class TestShardSelection(unittest.TestCase):
+    def test_shard_is_parsed(self):
+        self.assertEqual((1, 3), parse_shard('2/3'))
+        for value in ('0/3', '4/3', '1', 'a/b'):
+            with self.assertRaises(ValueError):
+                parse_shard(value)
+
+    def test_chunks_are_assigned_round_robin(self):
+        offsets = range(0, 100, 20)
+        self.assertEqual([0, 60], shard_offsets(offsets, (0, 3)))
+        self.assertEqual([20, 80], shard_offsets(offsets, (1, 3)))
+        self.assertEqual([40], shard_offsets(offsets, (2, 3)))
+        self.assertEqual(list(offsets), shard_offsets(offsets, None))
+
+
+class TestShardVerification(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.wiki_dir = self.tmp_dir.name + '/wiki'
+        make_wiki(self.wiki_dir, dict(
+            ('ns%d:page%d' % (i % 3, i), 'Text %d' % i) for i in range(11)))
+        self.shard_dirs = []
+        for index in range(3):
+            shard_dir = self.tmp_dir.name + '/shard%d' % index
+            os.mkdir(shard_dir)
+            Export(DokuWiki(self.wiki_dir), pages_per_file=2,
+                   shard=(index, 3)).write(shard_dir)
+            self.shard_dirs.append(shard_dir)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_shards_equal_single_export(self):
+        single = dict(Export(DokuWiki(self.wiki_dir),
+                             pages_per_file=2).chunks())
+        sharded = {}
+        for chunk_path in find_chunks(self.shard_dirs):
+            with open(chunk_path, 'rb') as chunk_file:
+                sharded[os.path.basename(chunk_path)] = chunk_file.read()
+        self.assertEqual(single, sharded)
+        self.assertEqual([], verify_chunks(find_chunks(self.shard_dirs)))
+
+    def test_missing_shard_is_detected(self):
+        problems = verify_chunks(find_chunks(self.shard_dirs[:2]))
+        self.assertEqual(1, len(problems))
+        self.assertIn('missing', problems[0])
+
+    def test_missing_files_are_detected(self):
+        self.assertEqual(['No export files were found.'], verify_chunks([]))
+        broken_path = self.shard_dirs[0] + '/findologic_0_2.xml'
+        with open(broken_path, 'w') as broken_file:
+            broken_file.write('<findologic/>')
+        problems = verify_chunks([broken_path])
+        self.assertIn('The total could not be determined from any file.',
+                      problems)
+
+    def test_malformed_files_are_detected(self):
+        chunk_path = self.shard_dirs[0] + '/findologic_0_2.xml'
+        with open(chunk_path, 'rb') as chunk_file:
+            data = chunk_file.read()
+        for original, malformed in ((b'<item id="0"', b'<item'),
+                                    (b'<item id="0"', b'<item id="zero"'),
+                                    (b'total="11"', b'total="many"'),
+                                    (b'start="0"', b'')):
+            self.assertIn(original, data)
+            with open(chunk_path, 'wb') as chunk_file:
+                chunk_file.write(data.replace(original, malformed, 1))
+            problems = verify_chunks(find_chunks(self.shard_dirs))
+            self.assertIn('%s is a malformed file' % chunk_path, problems[0])
+
+    def test_duplicate_chunk_is_detected(self):
+        shutil.copy(self.shard_dirs[0] + '/findologic_0_2.xml',
+                    self.shard_dirs[1])
+        problems = verify_chunks(find_chunks(self.shard_dirs))
+        self.assertEqual(2, len(problems))
+        self.assertIn('Item 0 is in both', problems[0])
@@ -1,5 +1,9 @@
 import unittest
 
+from lxml import etree
+
+import dokuwiki2findologic.xml as xml
+
 
 class TestXmlWriting(unittest.TestCase):
     def test_xml_is_valid(self):
@@ -9,4 +13,21 @@ class TestXmlWriting(unittest.TestCase):
         pass
 
     def test_pages_in_excluded_path_are_not_exported(self):
-        pass
\ No newline at end of file
+        pass
+
+class TestTextEscaping(unittest.TestCase):
+    def test_text_bytes_are_escaped_like_lxml(self):
+        text = 'Fish & chips <b>für</b> everyone > 3\r\n' * 5000
+        escaped = b''.join(xml.escape_text_bytes(text.encode('utf-8')))
+        element = etree.Element('description')
+        element.text = text
+        expected = etree.tostring(element, encoding='utf-8')
+        self.assertEqual(expected, b'<description>' + escaped +
+                         b'</description>')
+
+    def test_invalid_characters_are_rejected(self):
+        with self.assertRaises(ValueError):
+            list(xml.escape_text_bytes(b'bell \x07'))
+        for noncharacter in ('\ufffe', '\uffff'):
+            with self.assertRaises(ValueError):
+                list(xml.escape_text_bytes(noncharacter.encode('utf-8')))
@@ -1,8 +1,26 @@
+from itertools import islice
 import json
+import os
+import re
 
 from lxml import etree
 
 from dokuwiki2findologic.logger import logger
+from dokuwiki2findologic.prefetch import prefetched
+
+# Characters that must be escaped in XML text content. Carriage returns are
+# escaped like LXML does, as parsers would normalize them away otherwise.
+_SPECIAL_CHARACTERS = re.compile(b'[&<>\r]')
+# Size of the blocks in which text is escaped. Blocks without special
+# characters are passed on without copying them.
+ESCAPE_BLOCK_SIZE = 64 * 1024
+# Size of the blocks in which cached items are streamed.
+CACHE_BLOCK_SIZE = 64 * 1024
+# Control characters and the noncharacters U+FFFE and U+FFFF, which may not
+# appear in XML 1.0 documents at all.
+_INVALID_CHARACTERS = re.compile(
+    b'[\x00-\x08\x0b\x0c\x0e-\x1f]|\xef\xbf[\xbe\xbf]')
+_EMPTY_DESCRIPTION = b'<description></description>'
 
 
 def stringify(text):
@@ -20,6 +38,30 @@ def stringify(text):
     return text
 
 
+def escape_text_bytes(text):
+    """
+    Escapes UTF-8 encoded text for use as XML text content without decoding
+    it. The text is processed in blocks of ESCAPE_BLOCK_SIZE bytes. Blocks that
+    need no escaping are returned as views into the original buffer, others
+    are copied one at a time, so no full copy of the text is ever created.
+
+    :param text: The bytes-like object to escape.
+    :return: Generator of bytes-like objects that form the escaped text.
+    """
+    if _INVALID_CHARACTERS.search(text) is not None:
+        raise ValueError('Text contains characters that are not allowed in '
+                         'XML.')
+    view = memoryview(text)
+    for start in range(0, len(view), ESCAPE_BLOCK_SIZE):
+        block = view[start:start + ESCAPE_BLOCK_SIZE]
+        if _SPECIAL_CHARACTERS.search(block) is None:
+            yield block
+        else:
+            yield block.tobytes().replace(b'&', b'&amp;') \
+                .replace(b'<', b'&lt;').replace(b'>', b'&gt;') \
+                .replace(b'\r', b'&#13;')
+
+
 def add_unused_item_children(item):
     """
     Adds required, but unused elements to the item element.
@@ -116,13 +158,15 @@ def restrict_visibility(item, page, roles):
     logger.debug('Anyone can access %s.' % page.path)
 
 
-def add_regular_item_values(item, page):
+def add_regular_item_values(item, page, include_text=True):
     """
     Adds simple, regular values to the item, including the path of the page,
     title, summary, full text, and update date.
 
     :param item: The item to modify.
     :param page: The page sourcing the data.
+    :param include_text: If False, the description element is left empty, so
+        the full text can be inserted when serializing.
     """
     all_ordernumbers = etree.SubElement(item, 'allOrdernumbers')
     add_single_nested_data(all_ordernumbers, 'ordernumbers', 'ordernumber',
@@ -130,7 +174,8 @@ def add_regular_item_values(item, page):
 
     add_single_nested_data(item, 'names', 'name', page.title)
     add_single_nested_data(item, 'summaries', 'summary', page.description)
-    add_single_nested_data(item, 'descriptions', 'description', page.text)
+    add_single_nested_data(item, 'descriptions', 'description',
+                           page.text if include_text else '')
 
     date_addeds = etree.SubElement(item, 'dateAddeds')
     if page.updated_at is not None:
@@ -155,7 +200,7 @@ def add_child_with_text(parent, element_name, text):
 
 
 def create_item_for_page(parent, identifier, page, page_url_prefix,
-                         cat_delimiter, cat_prefix, roles):
+                         cat_delimiter, cat_prefix, roles, include_text=True):
     """
     Creates an export item representing a page. Should not be called for pages
     that are excluded from export!
@@ -172,11 +217,12 @@ def create_item_for_page(parent, identifier, page, page_url_prefix,
         generated.
     :param roles The roles configured for the selected DokuWiki instance, which
         are used for usergroup-based visibility restriction.
+    :param include_text If False, the description element is left empty.
     :return: The generated item.
     """
     item = etree.SubElement(parent, 'item', id=str(identifier))
 
-    add_regular_item_values(item, page)
+    add_regular_item_values(item, page, include_text)
 
     page_url = page_url_prefix + str(page.path)
     add_single_nested_data(item, 'urls', 'url', page_url)
@@ -221,8 +267,180 @@ def add_single_nested_data(item, group_name, element_name, text):
     return group
 
 
+def chunk_file_name(offset, count):
+    """
+    :param offset: Offset from the total pages at which the chunk starts.
+    :param count: Number of pages per chunk.
+    :return: The name of the XML file holding the chunk.
+    """
+    return 'findologic_%d_%d.xml' % (offset, count)
+
+
+def serialize_item_pieces(identifier, page, page_url_prefix, cat_delimiter,
+                          cat_prefix, roles):
+    """
+    Creates the export item for a page and serializes it on its own, so items
+    can be streamed without building the whole document tree first.
+
+    The page text is not passed through LXML. Instead, its UTF-8 encoded
+    bytes are escaped and inserted into the description element, so large
+    pages are not decoded, re-encoded and copied several times.
+
+    :param identifier: Unique ID of the item.
+    :param page: The page to export.
+    :param page_url_prefix: The URL preceding the page's path.
+    :param cat_delimiter Separator used in the page path that is used to split
+        it up to create a hierarchical category attribute.
+    :param cat_prefix Path prefix that is removed before the cat value is
+        generated.
+    :param roles The roles used for usergroup-based visibility restriction.
+    :return: Generator of bytes-like objects forming the UTF-8 encoded
+        ``<item>`` element.
+    """
+    items = etree.Element('items')
+    item = create_item_for_page(items, identifier, page, page_url_prefix,
+                                cat_delimiter, cat_prefix, roles,
+                                include_text=False)
+    serialized = etree.tostring(item, encoding='utf-8', pretty_print=True)
+    # Escaped text content never contains '<', so this can only match the
+    # element itself.
+    split_at = serialized.index(_EMPTY_DESCRIPTION) + len(b'<description>')
+    # The ID is yielded separately, so the rest of the item can be cached.
+    id_length = len(_item_id_prefix(identifier))
+    yield serialized[:id_length]
+    yield serialized[id_length:split_at]
+    for piece in escape_text_bytes(page.text_bytes):
+        yield piece
+    yield serialized[split_at:]
+
+
+def _item_id_prefix(identifier):
+    return ('<item id="%d"' % identifier).encode('utf-8')
+
+
+def _store_item(cache, key, pieces):
+    """
+    Passes the pieces of an item through while caching all of them but the
+    first, which holds the ID. The ID depends on the position of the page in
+    the export rather than the page itself.
+    """
+    pieces = iter(pieces)
+    yield next(pieces)
+    for piece in cache.store(key, pieces):
+        yield piece
+
+
+def _cached_item(identifier, cache_file):
+    """
+    Streams a cached item in blocks, preceded by its ID, and closes the file.
+    """
+    with cache_file:
+        yield _item_id_prefix(identifier)
+        for block in iter(lambda: cache_file.read(CACHE_BLOCK_SIZE), b''):
+            yield block
+
+
+def serialize_item(identifier, page, page_url_prefix, cat_delimiter,
+                   cat_prefix, roles):
+    """
+    Creates the export item for a page and serializes it on its own, so items
+    can be streamed without building the whole document tree first.
+
+    :param identifier: Unique ID of the item.
+    :param page: The page to export.
+    :param page_url_prefix: The URL preceding the page's path.
+    :param cat_delimiter Separator used in the page path that is used to split
+        it up to create a hierarchical category attribute.
+    :param cat_prefix Path prefix that is removed before the cat value is
+        generated.
+    :param roles The roles used for usergroup-based visibility restriction.
+    :return: The UTF-8 encoded ``<item>`` element.
+    """
+    return b''.join(serialize_item_pieces(identifier, page, page_url_prefix,
+                                          cat_delimiter, cat_prefix, roles))
+
+
+def needs_serialization(cache):
+    """
+    :param cache: Optional FragmentCache.
+    :return: Function that checks whether a page's item is missing from the
+        cache, so its files have to be read. Suitable for prefetched().
+    """
+    if cache is None:
+        return None
+    return lambda page: not cache.contains(cache.key(page))
+
+
+def iter_items(pages, offset, page_url_prefix, cat_delimiter, cat_prefix,
+               roles, on_finish=None, cache=None):
+    """
+    Serializes pages as items with IDs starting at offset. Items found in the
+    cache are streamed from it as they are. The items of the remaining pages are added to
+    the cache. The other parameters are the same as for write_xml_page().
+
+    :param pages: Iterable of the pages to serialize, e.g. from prefetched().
+    :return: Generator of one iterable of bytes-like objects per item. Each of
+        them has to be consumed before advancing to the next item.
+    """
+    unique_id = offset
+    reused = 0
+    for page in pages:
+        key = cache.key(page) if cache is not None else None
+        cache_file = cache.open(key) if key is not None else None
+        if cache_file is None:
+            pieces = serialize_item_pieces(unique_id, page, page_url_prefix,
+                                           cat_delimiter, cat_prefix, roles)
+            if cache is not None:
+                pieces = _store_item(cache, key, pieces)
+        else:
+            reused += 1
+            pieces = _cached_item(unique_id, cache_file)
+        yield pieces
+        unique_id += 1
+        if on_finish is not None:
+            on_finish(unique_id, page)
+    if cache is not None:
+        logger.debug('Reused %d of %d cached items.' % (
+            reused, unique_id - offset))
+
+
+def iter_chunk(pages, offset, count, page_url_prefix, cat_delimiter,
+               cat_prefix, roles, on_finish=None, executor=None,
+               prefetch_depth=0, cache=None, source=None):
+    """
+    Generates the XML export document for a range of DokuWiki pages piece by
+    piece, so it can be streamed to a file or upload without keeping it in
+    memory as a whole. The parameters are the same as for write_xml_page().
+
+    :return: Generator of bytes-like objects forming the UTF-8 encoded
+        document.
+    """
+    curr_pages = pages[offset:(offset + count)]
+    yield ('<findologic version="1.0">\n'
+           '  <items start="%d" count="%d" total="%d">\n' %
+           (offset, count, len(pages))).encode('utf-8')
+
+    if source is None:
+        chunk_pages = prefetched(curr_pages, executor, prefetch_depth,
+                                 needs_serialization(cache))
+    else:
+        chunk_pages = islice(source, len(curr_pages))
+    try:
+        for pieces in iter_items(chunk_pages, offset, page_url_prefix,
+                                 cat_delimiter, cat_prefix, roles, on_finish,
+                                 cache):
+            for piece in pieces:
+                yield piece
+    finally:
+        if source is None:
+            chunk_pages.close()
+
+    yield b'  </items>\n</findologic>\n'
+
+
 def write_xml_page(output_dir, pages, offset, count, page_url_prefix,
-                   cat_delimiter, cat_prefix, roles, on_finish=None):
+                   cat_delimiter, cat_prefix, roles, on_finish=None,
+                   executor=None, prefetch_depth=0, cache=None, source=None):
     """
     Generates XML export files for a range of DokuWiki pages.
 
@@ -240,21 +458,27 @@ def write_xml_page(output_dir, pages, offset, count, page_url_prefix,
     :param roles The roles configured for the selected DokuWiki instance, which
         are used for usergroup-based visibility restriction.
     :param on_finish: Optional function to call once a page has been processed.
+    :param executor: Optional executor used to read the files of upcoming
+        pages while the current one is being serialized.
+    :param prefetch_depth: Maximum number of pages read ahead by the executor.
+    :param cache: Optional FragmentCache from which unchanged items are reused.
+    :param source: Optional iterator of prefetched pages shared by consecutive
+        chunks, so reading ahead continues across chunk boundaries. The pages
+        of this chunk are taken from it instead of prefetching them here.
     :return:
     """
-    curr_pages = pages[offset:(offset + count)]
-    unique_id = offset
-    xml = etree.Element('findologic', version='1.0')
-    items = etree.SubElement(xml, 'items', start=str(offset), count=str(count),
-                             total=str(len(pages)))
-
-    for page in curr_pages:
-        create_item_for_page(items, unique_id, page, page_url_prefix,
-                             cat_delimiter, cat_prefix, roles)
-        unique_id += 1
-        if on_finish is not None:
-            on_finish(unique_id, page)
-
-    target_path = '%s/findologic_%d_%d.xml' % (output_dir, offset, count)
-    with open(target_path, 'wb') as outfile:
-        outfile.write(etree.tostring(xml, pretty_print=True))
+    target_path = '%s/%s' % (output_dir, chunk_file_name(offset, count))
+    # The file is streamed to a temporary path first, so a failure can't leave
+    # a truncated export file behind.
+    temp_path = '%s.%d.tmp' % (target_path, os.getpid())
+    try:
+        with open(temp_path, 'wb') as outfile:
+            outfile.writelines(iter_chunk(pages, offset, count,
+                                          page_url_prefix, cat_delimiter,
+                                          cat_prefix, roles, on_finish,
+                                          executor, prefetch_depth, cache,
+                                          source))
+        os.replace(temp_path, target_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
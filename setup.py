@@ -11,6 +11,7 @@ setup(name='dokuwiki2findologic',
       packages=['dokuwiki2findologic'],
       entry_points={
         'console_scripts': [
-            'dokuwiki2findologic=dokuwiki2findologic:do_export'
+            'dokuwiki2findologic=dokuwiki2findologic:do_export',
+            'dokuwiki2findologic-verify=dokuwiki2findologic:verify_export'
         ],
       })